@@ -1,10 +1,101 @@
 import os
+import asyncio
+import hashlib
+import json
+import tempfile
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 import fitz
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.schema import Document
-from typing import List
+from embedding_cache import EmbeddingCache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from semantic_text_splitter import TextSplitter
+except ImportError:
+    TextSplitter = None
+
+# Number of texts sent to the embeddings API per request
+EMBEDDING_BATCH_SIZE = 1000
+
+# Number of chunks embedded and written to Chroma together, and how many
+# of those batches may be in flight at once. A write batch fits in a single
+# embeddings request, so this also caps concurrent API requests.
+WRITE_BATCH_SIZE = 512
+MAX_CONCURRENT_WRITE_BATCHES = 5
+
+# Chunks buffered from the document stream before they are indexed, enough
+# to keep every concurrent write batch busy
+STREAM_BUFFER_SIZE = WRITE_BATCH_SIZE * MAX_CONCURRENT_WRITE_BATCHES
+
+# Where the Chroma vector database is persisted between runs, and the file
+# recording the modification time of every PDF it was built from
+CHROMA_DIRECTORY = "./chroma_db"
+MANIFEST_PATH = os.path.join(CHROMA_DIRECTORY, "processed_pdfs.json")
+
+# HNSW index settings for the Chroma collection, tuned for recall at
+# interactive query latency rather than Chroma's defaults
+HNSW_COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64
+}
+
+# Plain-text extraction flags. These are get_text("text")'s defaults, written
+# out so the extraction mode is explicit; they already exclude images.
+TEXT_EXTRACTION_FLAGS = fitz.TEXTFLAGS_TEXT
+
+
+def find_pdf_paths(documents_folder: str) -> List[str]:
+    """
+    List the PDF files in a folder
+    Args:
+        documents_folder: Path to folder containing PDF files
+    Returns:
+        Paths of the PDF files, in directory order
+    """
+    # scandir's entries carry their file type, so no extra stat per file
+    with os.scandir(documents_folder) as entries:
+        return [
+            entry.path for entry in entries
+            if entry.is_file() and entry.name.lower().endswith('.pdf')
+        ]
+
+
+def extract_text_from_pdf(pdf_path: str) -> Tuple[str, str]:
+    """
+    Extract all text from a PDF file
+    Kept at module level so it can be pickled into worker processes
+    Args:
+        pdf_path: Path to the PDF file
+    Returns:
+        Tuple of (file name, extracted text)
+    """
+    pdf_file = os.path.basename(pdf_path)
+    try:
+        doc = fitz.open(pdf_path)
+
+        # Collect the pieces and join once; += on str is quadratic
+        parts = []
+        for page_num, page in enumerate(doc):
+            parts.append(page.get_text("text", flags=TEXT_EXTRACTION_FLAGS, sort=False))
+            parts.append(f"\n--- Page {page_num + 1} ---\n")
+        text = "".join(parts)
+
+        doc.close()
+
+    except Exception as e:
+        print(f"Error processing {pdf_path}: {str(e)}")
+        return pdf_file, ""
+
+    return pdf_file, text
+
 
 class DocumentProcessor:
     """
@@ -12,14 +103,41 @@ class DocumentProcessor:
     and creating a searchable vector database
     """
 
-    def __init__(self, openai_api_key: str):  # FIXED: Add openai_api_key parameter
-        """Initialize with OpenAI API key for embeddings"""
-        self.embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
+    def __init__(
+        self,
+        openai_api_key: str,  # FIXED: Add openai_api_key parameter
+        use_native_splitter: bool = True,
+        embedding_cache_path: str = "./embedding_cache.sqlite3",
+        use_fuzzy_cache: bool = False
+    ):
+        """
+        Initialize with OpenAI API key for embeddings
+        Args:
+            openai_api_key: OpenAI API key
+            use_native_splitter: Chunk with the Rust semantic-text-splitter when
+                it is installed, otherwise fall back to LangChain's splitter
+            embedding_cache_path: SQLite file caching chunk embeddings between runs
+            use_fuzzy_cache: Also reuse cached embeddings of near-identical chunks
+                (SimHash); off by default since small edits can change meaning
+        """
+        self.embeddings = OpenAIEmbeddings(
+            openai_api_key=openai_api_key,
+            chunk_size=EMBEDDING_BATCH_SIZE,
+            max_retries=6
+        )
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             separators=["\n\n", "\n", " ", ""]  # FIXED: Uncommented separators
         )
+        self.native_splitter = None
+        if use_native_splitter and TextSplitter is not None:
+            self.native_splitter = TextSplitter(capacity=1000, overlap=200)
+        self.embedding_cache = EmbeddingCache(
+            embedding_cache_path,
+            model=self.embeddings.model,
+            use_simhash=use_fuzzy_cache
+        )
         self.vectorstore = None
 
     def extract_text_from_pdf(self, pdf_path: str) -> str:
@@ -30,83 +148,332 @@ class DocumentProcessor:
         Returns:
             Extracted text as a string
         """
-        text = ""
-        try:
-            doc = fitz.open(pdf_path)
+        return extract_text_from_pdf(pdf_path)[1]
 
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text += page.get_text()
-                text += f"\n--- Page {page_num + 1} ---\n"
+    def iter_documents(self, pdf_paths: Iterable[str]) -> Iterator[Document]:
+        """
+        Lazily load PDF files as Document objects, so only a few PDFs'
+        text is held in memory at a time
+        Args:
+            pdf_paths: Paths of the PDF files, e.g. from find_pdf_paths
+        Yields:
+            Document objects, in the order of pdf_paths
+        """
+        pdf_paths = iter(pdf_paths)
 
-            doc.close()
+        # Text extraction is CPU-bound, so parse the PDFs in worker processes.
+        # Only a bounded number are submitted ahead, and the workers keep
+        # parsing those while the caller is busy indexing the last one.
+        max_workers = min(os.cpu_count() or 1, 4)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            for pdf_path in islice(pdf_paths, max_workers * 2):
+                pending.append((pdf_path, executor.submit(extract_text_from_pdf, pdf_path)))
 
-        except Exception as e:
-            print(f"Error processing {pdf_path}: {str(e)}")
-            return ""
+            while pending:
+                pdf_path, future = pending.popleft()
+                pdf_file, text = future.result()
+                next_path = next(pdf_paths, None)
+                if next_path is not None:
+                    pending.append((next_path, executor.submit(extract_text_from_pdf, next_path)))
 
-        return text
+                if text.strip():
+                    yield Document(
+                        page_content=text,
+                        metadata={
+                            "source": pdf_file,
+                            "file_path": pdf_path
+                        }
+                    )
 
-    def load_documents(self, documents_folder: str) -> List[Document]:
+    async def _aembed_chunks(self, texts: List[str]) -> List[List[float]]:
         """
-        Load all PDF files from a folder and convert them to Document objects
+        Embed chunk texts, only calling the API for chunks not already cached
         Args:
-            documents_folder: Path to folder containing PDF files
+            texts: Chunk texts to embed
         Returns:
-            List of Document objects
+            One embedding per text, in the same order
         """
-        documents = []
+        hashes = [EmbeddingCache.hash_text(text) for text in texts]
+        cached = self.embedding_cache.get_many(hashes)
+
+        # Fall back to near-identical chunks, e.g. after a whitespace or typo fix.
+        # Fingerprints are computed once and reused when storing the misses.
+        fingerprints = {
+            h: self.embedding_cache.fingerprint(text)
+            for h, text in zip(hashes, texts) if h not in cached
+        }
+        cached.update(self.embedding_cache.get_similar_many(fingerprints))
 
-        pdf_files = [f for f in os.listdir(documents_folder) if f.endswith('.pdf')]
+        misses = [i for i, h in enumerate(hashes) if h not in cached]
+        new_embeddings = []
+        if misses:
+            new_embeddings = await self.embeddings.aembed_documents([texts[i] for i in misses])
+        self.embedding_cache.put_many(
+            {hashes[i]: embedding for i, embedding in zip(misses, new_embeddings)},
+            {hashes[i]: fingerprints[hashes[i]] for i in misses}
+        )
 
-        for pdf_file in pdf_files:
-            pdf_path = os.path.join(documents_folder, pdf_file)
+        embeddings = dict(cached)
+        for i, embedding in zip(misses, new_embeddings):
+            embeddings[hashes[i]] = embedding
+
+        return [list(map(float, embeddings[h])) for h in hashes]
+
+    def _add_embeddings(self, texts: List[str], embeddings: List[List[float]], metadatas: List[dict]):
+        """
+        Write pre-computed embeddings into the vector database
+        Args:
+            texts: Chunk texts
+            embeddings: Embedding for each chunk
+            metadatas: Metadata for each chunk
+        """
+        if not texts:
+            return
 
-            text = self.extract_text_from_pdf(pdf_path)
-            if text.strip():
-                doc = Document(
-                    page_content=text,
-                    metadata={
-                        "source": pdf_file,
-                        "file_path": pdf_path
-                    }
+        # Chroma's LangChain wrapper always re-embeds in add_texts, so
+        # write straight to the underlying collection instead
+        self.vectorstore._collection.upsert(
+            ids=[str(uuid.uuid4()) for _ in texts],
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=metadatas
+        )
+
+    @staticmethod
+    def _group_duplicate_chunks(chunks: List[Document]) -> List[List[Document]]:
+        """
+        Group chunks with identical text so each text is embedded once
+        Args:
+            chunks: Chunk Documents to group
+        Returns:
+            One list of chunks per distinct text, in first-seen order
+        """
+        seen: Dict[str, int] = {}
+        groups: List[List[Document]] = []
+
+        for chunk in chunks:
+            key = hashlib.blake2b(chunk.page_content.encode(), digest_size=16).hexdigest()
+            if key in seen:
+                groups[seen[key]].append(chunk)
+            else:
+                seen[key] = len(groups)
+                groups.append([chunk])
+
+        return groups
+
+    async def _aindex_chunks(self, chunks: List[Document]):
+        """
+        Embed chunks and write them to the vector database in batches,
+        with several batches in flight at once
+        Args:
+            chunks: Chunk Documents to index
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_WRITE_BATCHES)
+        groups = self._group_duplicate_chunks(chunks)
+
+        async def index_batch(batch: List[List[Document]]):
+            async with semaphore:
+                unique_embeddings = await self._aembed_chunks(
+                    [group[0].page_content for group in batch]
                 )
-                documents.append(doc)
 
-        return documents
+                # Every copy keeps its own metadata but shares the embedding
+                texts, embeddings, metadatas = [], [], []
+                for group, embedding in zip(batch, unique_embeddings):
+                    for chunk in group:
+                        texts.append(chunk.page_content)
+                        embeddings.append(embedding)
+                        metadatas.append(chunk.metadata)
+                self._add_embeddings(texts, embeddings, metadatas)
+
+        await asyncio.gather(*(
+            index_batch(groups[i:i + WRITE_BATCH_SIZE])
+            for i in range(0, len(groups), WRITE_BATCH_SIZE)
+        ))
 
-    def create_vector_database(self, documents: List[Document]):
+    def split_document(self, doc: Document) -> List[Document]:
         """
-        Split documents into chunks and create a searchable vector database
+        Split a document into chunks that keep the document's metadata
         Args:
-            documents: List of Document objects to process
+            doc: Document to split
+        Returns:
+            List of chunk Documents
         """
-        all_chunks = []
+        if self.native_splitter is None:
+            return self.text_splitter.split_documents([doc])
+
+        return [
+            Document(page_content=chunk, metadata=dict(doc.metadata))
+            for chunk in self.native_splitter.chunks(doc.page_content)
+        ]
+
+    def create_vector_database(self, documents: Iterable[Document]) -> int:
+        """
+        Split documents into chunks and add them to the searchable vector database.
+        Documents are consumed as a stream and indexed in buffered batches.
+        Args:
+            documents: Document objects to process, e.g. from iter_documents
+        Returns:
+            Number of documents indexed
+        """
+        # One event loop for the whole stream: the embeddings client keeps
+        # pooled connections bound to the loop that first used them
+        return asyncio.run(self._acreate_vector_database(documents))
+
+    async def _acreate_vector_database(self, documents: Iterable[Document]) -> int:
+        """
+        Async body of create_vector_database
+        Args:
+            documents: Document objects to process
+        Returns:
+            Number of documents indexed
+        """
+        num_documents = 0
+        buffer = []
+
         for doc in documents:
-            chunks = self.text_splitter.split_documents([doc])
+            num_documents += 1
+            # Retrieval reads metadata["source"] directly, so every chunk needs one
+            if not doc.metadata.get("source"):
+                doc.metadata["source"] = "Unknown"
             # FIXED: Use extend instead of append to flatten the list
-            all_chunks.extend(chunks)
+            buffer.extend(self.split_document(doc))
+            if len(buffer) >= STREAM_BUFFER_SIZE:
+                await self._aflush_chunks(buffer)
+                buffer = []
 
-        self.vectorstore = Chroma.from_documents(
-            documents=all_chunks,
-            embedding=self.embeddings,
-            persist_directory="./chroma_db"
-        )
+        await self._aflush_chunks(buffer)
+        return num_documents
+
+    async def _aflush_chunks(self, chunks: List[Document]):
+        """
+        Index buffered chunks, creating the vector database on first use
+        Args:
+            chunks: Chunk Documents to index
+        """
+        if not chunks:
+            return
+
+        self._open_vectorstore()
+        await self._aindex_chunks(chunks)
+
+    def _open_vectorstore(self):
+        """Open (or create) the persisted vector database if not already open"""
+        if self.vectorstore is None:
+            self.vectorstore = Chroma(
+                embedding_function=self.embeddings,
+                persist_directory=CHROMA_DIRECTORY,
+                collection_metadata=HNSW_COLLECTION_METADATA
+            )
 
     def get_vectorstore(self):
         """Return the vector database for querying"""
         return self.vectorstore
 
-    def process_all_documents(self, documents_folder: str):
+    def _reset_vectorstore(self):
+        """Delete the persisted collection so it is recreated on next use"""
+        self._open_vectorstore()
+        self.vectorstore.delete_collection()
+        self.vectorstore = None
+
+    @staticmethod
+    def _pdf_mtimes(pdf_paths: List[str]) -> Dict[str, float]:
         """
-        Complete pipeline: load PDFs -> create vector database
+        Snapshot PDF modification times by file name. Taken before indexing, so
+        a PDF edited while it is being embedded still looks modified next run.
+        """
+        return {os.path.basename(path): os.path.getmtime(path) for path in pdf_paths}
+
+    @staticmethod
+    def _load_manifest() -> Optional[Dict[str, float]]:
+        """
+        Return the processed PDFs' mtimes by file name, or None if not recorded
+        or unreadable, either of which means the database must be rebuilt
+        """
+        try:
+            with open(MANIFEST_PATH) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if isinstance(manifest, dict) else None
+
+    @staticmethod
+    def _save_manifest(manifest: Dict[str, float]):
+        """
+        Record the mtime of every processed PDF, including ones with no text.
+        Written to a temp file and swapped in, so an interrupted write can't
+        leave a truncated manifest behind.
+        """
+        with tempfile.NamedTemporaryFile(
+            "w", dir=CHROMA_DIRECTORY, suffix=".tmp", delete=False
+        ) as f:
+            json.dump(manifest, f)
+        os.replace(f.name, MANIFEST_PATH)
+
+    def process_all_documents(self, documents_folder: str, pdf_paths: Optional[List[str]] = None):
+        """
+        Complete pipeline: load PDFs -> create vector database.
+        Any previously persisted collection is replaced.
         Args:
             documents_folder: Path to folder containing PDF files
+            pdf_paths: PDF files already listed from the folder; scanned if not given
         """
-        documents = self.load_documents(documents_folder)
+        if pdf_paths is None:
+            pdf_paths = find_pdf_paths(documents_folder)
+        mtimes = self._pdf_mtimes(pdf_paths)
+
+        self._reset_vectorstore()
+        num_documents = self.create_vector_database(self.iter_documents(pdf_paths))
 
-        if not documents:
+        if not num_documents:
             print("No documents found or processed!")
             return
 
-        self.create_vector_database(documents)
\ No newline at end of file
+        self._save_manifest(mtimes)
+
+    def update_vector_database(self, documents_folder: str, pdf_paths: Optional[List[str]] = None):
+        """
+        Reuse the persisted vector database, only re-processing PDFs that were
+        added or modified since they were last processed and dropping removed ones.
+        Falls back to the complete pipeline when nothing usable has been persisted.
+        Args:
+            documents_folder: Path to folder containing PDF files
+            pdf_paths: PDF files already listed from the folder; scanned if not given
+        """
+        if pdf_paths is None:
+            pdf_paths = find_pdf_paths(documents_folder)
+
+        manifest = self._load_manifest()
+        if manifest is None:
+            # Nothing persisted yet, or a database from an older version that
+            # used the default distance and re-added every chunk on each start
+            if os.path.exists(os.path.join(CHROMA_DIRECTORY, "chroma.sqlite3")):
+                print("Rebuilding vector database...")
+            self.process_all_documents(documents_folder, pdf_paths)
+            return
+
+        self._open_vectorstore()
+        collection = self.vectorstore._collection
+        if (collection.metadata or {}).get("hnsw:space") != HNSW_COLLECTION_METADATA["hnsw:space"]:
+            print("Rebuilding vector database...")
+            self.process_all_documents(documents_folder, pdf_paths)
+            return
+
+        mtimes = self._pdf_mtimes(pdf_paths)
+        changed = [
+            path for path in pdf_paths
+            if manifest.get(os.path.basename(path)) != mtimes[os.path.basename(path)]
+        ]
+
+        # Drop chunks of removed PDFs and of changed PDFs about to be re-added
+        outdated = (set(manifest) - set(mtimes)) | {os.path.basename(path) for path in changed}
+        for source in outdated:
+            collection.delete(where={"source": source})
+
+        if changed:
+            print(f"Processing {len(changed)} new or modified document(s)...")
+            self.create_vector_database(self.iter_documents(changed))
+
+        if changed or outdated:
+            self._save_manifest(mtimes)
\ No newline at end of file
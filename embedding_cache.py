@@ -0,0 +1,255 @@
+import hashlib
+import sqlite3
+import time
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from simhash import Simhash
+except ImportError:
+    Simhash = None
+
+# SQLite caps the number of bound parameters per statement
+_QUERY_BATCH_SIZE = 500
+
+# SimHash fingerprints are split into this many 16-bit blocks for bucketing.
+# Two fingerprints within Hamming distance 3 must share at least one block.
+_SIMHASH_BLOCKS = 4
+_SIMHASH_BLOCK_BITS = 16
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of chunk embeddings keyed by the SHA-256 of the chunk text,
+    so re-ingesting unchanged documents doesn't call the embeddings API again.
+    Optionally, chunks that only differ by small edits are matched through
+    their SimHash fingerprint as a fallback. SimHash can't tell a typo fix from
+    an edit that changes the meaning (e.g. an inserted "not"), so this is off
+    by default.
+    The cache is tied to one embeddings model and cleared when that changes.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "./embedding_cache.sqlite3",
+        model: str = "",
+        use_simhash: bool = False,
+        maxsize: int = 100_000,
+        max_simhash_distance: int = 3
+    ):
+        """
+        Open (or create) the cache database
+        Args:
+            db_path: Path to the SQLite file backing the cache
+            model: Name of the embeddings model the cached vectors came from
+            use_simhash: Reuse vectors of near-identical chunks on an exact miss;
+                requires the simhash package
+            maxsize: Maximum number of embeddings kept; least recently used go first
+            max_simhash_distance: Largest Hamming distance between SimHash
+                fingerprints that still counts as the same chunk
+        """
+        self.use_simhash = use_simhash and Simhash is not None
+        self.maxsize = maxsize
+        self.max_simhash_distance = max_simhash_distance
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "hash TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL, "
+            "simhash INTEGER)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS chunks_last_used ON chunks (last_used)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+
+        # Vectors from another model have the wrong meaning or dimension
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'model'").fetchone()
+        if row is None or row[0] != model:
+            self.conn.execute("DELETE FROM chunks")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('model', ?)", (model,)
+            )
+        self.conn.commit()
+
+        # In-memory SimHash index, built lazily: hash -> fingerprint, and
+        # (block index, block value) -> hashes whose fingerprint has that block
+        self._simhash_keys: Dict[str, int] = {}
+        self._simhash_buckets: Optional[Dict[Tuple[int, int], Set[str]]] = None
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """Return the cache key for a chunk of text"""
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def fingerprint(self, text: str) -> Optional[int]:
+        """Return the 64-bit SimHash of a chunk, or None when SimHash matching is off"""
+        if not self.use_simhash:
+            return None
+        return Simhash(text).value
+
+    @staticmethod
+    def _to_signed(fingerprint: int) -> int:
+        """SQLite integers are signed 64-bit"""
+        return fingerprint - (1 << 64) if fingerprint >= (1 << 63) else fingerprint
+
+    @staticmethod
+    def _blocks(fingerprint: int):
+        mask = (1 << _SIMHASH_BLOCK_BITS) - 1
+        for block in range(_SIMHASH_BLOCKS):
+            yield block, (fingerprint >> (block * _SIMHASH_BLOCK_BITS)) & mask
+
+    def _index_fingerprint(self, key: str, fingerprint: Optional[int]):
+        """Point the SimHash index at a key's current fingerprint"""
+        self._unindex_fingerprint(key)
+        if fingerprint is None:
+            return
+        self._simhash_keys[key] = fingerprint
+        for bucket in self._blocks(fingerprint):
+            self._simhash_buckets.setdefault(bucket, set()).add(key)
+
+    def _unindex_fingerprint(self, key: str):
+        """Remove a replaced or evicted key from the SimHash index"""
+        fingerprint = self._simhash_keys.pop(key, None)
+        if fingerprint is None:
+            return
+        for bucket in self._blocks(fingerprint):
+            keys = self._simhash_buckets[bucket]
+            keys.discard(key)
+            if not keys:
+                del self._simhash_buckets[bucket]
+
+    def _load_simhash_index(self):
+        self._simhash_keys = {}
+        self._simhash_buckets = {}
+        rows = self.conn.execute("SELECT hash, simhash FROM chunks WHERE simhash IS NOT NULL")
+        for key, signed in rows:
+            self._index_fingerprint(key, signed & ((1 << 64) - 1))
+
+    def _nearest(self, fingerprint: int) -> Optional[str]:
+        """Find the cached key whose fingerprint is closest, within the distance limit"""
+        best_key, best_distance = None, self.max_simhash_distance + 1
+        for bucket in self._blocks(fingerprint):
+            for key in self._simhash_buckets.get(bucket, ()):
+                distance = bin(self._simhash_keys[key] ^ fingerprint).count("1")
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+        return best_key
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up cached embeddings
+        Args:
+            hashes: Cache keys to look up
+        Returns:
+            Dictionary mapping each key that was found to its embedding
+        """
+        keys = list(dict.fromkeys(hashes))
+        found = {}
+
+        for i in range(0, len(keys), _QUERY_BATCH_SIZE):
+            batch = keys[i:i + _QUERY_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                f"SELECT hash, vector FROM chunks WHERE hash IN ({placeholders})",
+                batch
+            )
+            for key, vector in rows:
+                found[key] = np.frombuffer(vector, dtype=np.float32)
+
+        # Refresh recency so hits survive the next eviction
+        now = time.time()
+        self.conn.executemany(
+            "UPDATE chunks SET last_used = ? WHERE hash = ?",
+            [(now, key) for key in found]
+        )
+        self.conn.commit()
+
+        return found
+
+    def get_similar_many(self, fingerprints: Dict[str, Optional[int]]) -> Dict[str, np.ndarray]:
+        """
+        Look up embeddings of near-identical chunks for keys that missed exactly.
+        Each match is stored under the new key so the next lookup is exact.
+        Args:
+            fingerprints: Dictionary mapping missed cache keys to the SimHash
+                of their chunk text, from fingerprint()
+        Returns:
+            Dictionary mapping each key that was matched to its embedding
+        """
+        if not self.use_simhash or not fingerprints:
+            return {}
+        if self._simhash_buckets is None:
+            self._load_simhash_index()
+        # Nothing to match against yet, e.g. on the first ingest
+        if not self._simhash_keys:
+            return {}
+
+        matches = {}
+        for key, fingerprint in fingerprints.items():
+            if fingerprint is None:
+                continue
+            similar_key = self._nearest(fingerprint)
+            if similar_key is not None:
+                matches[key] = similar_key
+
+        # Candidates may have been evicted since the index was built
+        found = self.get_many(matches.values())
+        reused = {
+            key: found[similar_key]
+            for key, similar_key in matches.items()
+            if similar_key in found
+        }
+        self.put_many(reused, {key: fingerprints[key] for key in reused})
+
+        return reused
+
+    def put_many(
+        self,
+        embeddings: Dict[str, List[float]],
+        fingerprints: Optional[Dict[str, Optional[int]]] = None
+    ):
+        """
+        Store embeddings and evict the least recently used beyond maxsize
+        Args:
+            embeddings: Dictionary mapping cache keys to embeddings
+            fingerprints: SimHash of each key's chunk text, from fingerprint()
+        """
+        if not embeddings:
+            return
+
+        fingerprints = {key: (fingerprints or {}).get(key) for key in embeddings}
+
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO chunks (hash, vector, last_used, simhash) VALUES (?, ?, ?, ?)",
+            [
+                (
+                    key,
+                    np.asarray(vector, dtype=np.float32).tobytes(),
+                    now,
+                    None if fingerprints[key] is None else self._to_signed(fingerprints[key])
+                )
+                for key, vector in embeddings.items()
+            ]
+        )
+        evicted = [
+            key for key, in self.conn.execute(
+                "SELECT hash FROM chunks ORDER BY last_used DESC LIMIT -1 OFFSET ?",
+                (self.maxsize,)
+            )
+        ]
+        self.conn.executemany("DELETE FROM chunks WHERE hash = ?", [(key,) for key in evicted])
+        self.conn.commit()
+
+        # Keep the SimHash index in step with replaced and evicted rows
+        if self._simhash_buckets is not None:
+            for key, fingerprint in fingerprints.items():
+                self._index_fingerprint(key, fingerprint)
+            for key in evicted:
+                self._unindex_fingerprint(key)
+
+    def close(self):
+        """Close the cache database"""
+        self.conn.close()
@@ -1,9 +1,28 @@
 import os
-from typing import TypedDict, List
+from functools import lru_cache
+from typing import TypedDict, List, Optional, Tuple
 from langgraph.graph import StateGraph, END
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import Document
+from semantic_cache import SemanticAnswerCache
+
+
+SYSTEM_PROMPT = """You are an expert document analyst. Use the provided document context to answer the user's question comprehensively.
+
+Guidelines:
+- Answer based only on the information in the provided documents
+- If the documents don't contain enough information, say so clearly
+- Cite which documents you're referencing
+- Provide specific details and examples when available
+- If there are conflicting information, mention it"""
+
+HUMAN_PROMPT = """Context from documents:
+{context}
+
+Question: {question}
+
+Please provide a detailed answer based on the document context."""
 
 
 class WorkflowState(TypedDict):
@@ -12,6 +31,7 @@ class WorkflowState(TypedDict):
     Each step can read and modify this state
     """
     question: str
+    query_embedding: Optional[List[float]]  # Computed once in process_question
     retrieved_docs: List[Document]  # FIXED: Consistent naming
     answer: str
     confidence: str
@@ -31,6 +51,15 @@ class DocumentIntelligenceWorkflow:
             temperature=0,
             openai_api_key=openai_api_key  # FIXED: Pass the API key
         )
+        # Memoize query embeddings so repeated questions skip the embeddings API
+        self._embed_query_cached = lru_cache(maxsize=1024)(self._embed_query)
+        # Built once here rather than on every generate_answer call
+        self._prompt_template = ChatPromptTemplate.from_messages([
+            ("system", SYSTEM_PROMPT),
+            ("human", HUMAN_PROMPT)
+        ])
+        # Reuse full answers for near-duplicate questions
+        self.answer_cache = SemanticAnswerCache(threshold=0.95, capacity=256)
         # FIXED: Add parentheses to call the method
         self.workflow = self._create_workflow()
 
@@ -50,13 +79,21 @@ class DocumentIntelligenceWorkflow:
 
         return workflow.compile()
 
+    def _embed_query(self, question: str) -> Tuple[float, ...]:
+        """Embed a question with the vector database's embedding function"""
+        # Tuple so cached results can't be mutated by callers
+        return tuple(self.vectorstore._embedding_function.embed_query(question))
+
     def retrieve_documents(self, state: WorkflowState) -> WorkflowState:
         """
         Step 1: Find relevant documents based on the question
         """
+        query_embedding = state.get("query_embedding")
+        if query_embedding is None:
+            query_embedding = list(self._embed_query_cached(state["question"]))
         # FIXED: Typo - similarity_search not similarity_serach
-        relevant_docs = self.vectorstore.similarity_search(
-            state["question"],
+        relevant_docs = self.vectorstore.similarity_search_by_vector(
+            query_embedding,
             k=4
         )
         # FIXED: Use consistent key name
@@ -71,10 +108,10 @@ class DocumentIntelligenceWorkflow:
         # FIXED: Use consistent key name
         docs = state["retrieved_docs"]
 
-        source_files = list(set([
-            doc.metadata.get("source", "Unknown")  # FIXED: Capitalization
-            for doc in docs
-        ]))
+        # Ingestion guarantees every chunk has a source
+        sources = [doc.metadata["source"] for doc in docs]
+        # dict.fromkeys dedups in one pass and keeps retrieval order
+        source_files = list(dict.fromkeys(sources))
 
         # Determine confidence based on number of relevant docs
         if len(docs) >= 3:
@@ -94,29 +131,11 @@ class DocumentIntelligenceWorkflow:
         Step 3: Generate a comprehensive answer using the retrieved documents
         """
         context = "\n\n".join([
-            f"From {doc.metadata.get('source', 'Unknown')}:\n{doc.page_content}"
+            f"From {doc.metadata['source']}:\n{doc.page_content}"
             for doc in state["retrieved_docs"]  # FIXED: Use consistent key name
         ])
 
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", """You are an expert document analyst. Use the provided document context to answer the user's question comprehensively.
-
-Guidelines:
-- Answer based only on the information in the provided documents
-- If the documents don't contain enough information, say so clearly
-- Cite which documents you're referencing
-- Provide specific details and examples when available
-- If there are conflicting information, mention it"""),
-
-            ("human", """Context from documents:
-{context}
-
-Question: {question}
-
-Please provide a detailed answer based on the document context.""")
-        ])
-
-        prompt = prompt_template.format(
+        prompt = self._prompt_template.format(
             context=context,
             question=state["question"]
         )
@@ -135,9 +154,20 @@ Please provide a detailed answer based on the document context.""")
         Returns:
             Dictionary with answer, confidence, and sources
         """
+        query_embedding = list(self._embed_query_cached(question))
+
+        cached_result = self.answer_cache.lookup(query_embedding)
+        if cached_result is not None:
+            return {
+                **cached_result,
+                "source_files": list(cached_result["source_files"]),
+                "question": question,
+                "cached_question": cached_result["question"]
+            }
 
         initial_state = {
             "question": question,
+            "query_embedding": query_embedding,
             "retrieved_docs": [],  # FIXED: Use consistent key name
             "answer": "",
             "confidence": "",
@@ -146,10 +176,17 @@ Please provide a detailed answer based on the document context.""")
 
         final_state = self.workflow.invoke(initial_state)
 
-        return {
+        result = {
             "question": question,
             "answer": final_state["answer"],
             "confidence": final_state["confidence"],
             "source_files": final_state["source_files"],
             "num_sources": len(final_state["retrieved_docs"])  # FIXED: Use consistent key name
-        }
\ No newline at end of file
+        }
+        # Cache a copy so callers mutating the returned dict can't alter it
+        self.answer_cache.insert(
+            query_embedding,
+            dict(result, source_files=list(result["source_files"]))
+        )
+
+        return result
\ No newline at end of file
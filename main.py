@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from document_processor import DocumentProcessor
+from document_processor import DocumentProcessor, find_pdf_paths
 from langraph_workflow import DocumentIntelligenceWorkflow
 
 
@@ -31,12 +31,13 @@ class DocumentIntelligenceApp:
             print(f"Error: '{documents_folder}' folder not found!")
             return False
 
-        pdf_files = [f for f in os.listdir(documents_folder) if f.endswith(".pdf")]
-        if not pdf_files:
+        pdf_paths = find_pdf_paths(documents_folder)
+        if not pdf_paths:
             print(f"Error: No PDF files found in '{documents_folder}' folder!")
             return False
 
-        self.processor.process_all_documents(documents_folder)
+        # Reuses ./chroma_db from earlier runs, re-processing only changed PDFs
+        self.processor.update_vector_database(documents_folder, pdf_paths)
 
         # FIXED: Typo - vectorstore not vectostore
         vectorstore = self.processor.get_vectorstore()
@@ -108,6 +109,8 @@ class DocumentIntelligenceApp:
         print(f"\nConfidence: {result['confidence']}")
         print(f"Sources Used: {result['num_sources']} document chunks")
         print(f"Files Referenced: {', '.join(result['source_files'])}")
+        if "cached_question" in result:
+            print(f"(Answer reused from similar question: {result['cached_question']})")
         print("-" * 60)
 
     def show_sample_questions(self):
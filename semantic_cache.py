@@ -0,0 +1,61 @@
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+
+
+class SemanticAnswerCache:
+    """
+    In-memory cache of workflow results keyed by question embedding.
+    A new question reuses a cached answer when its embedding is close enough
+    (cosine similarity) to a previously answered one.
+    Entries are kept most-recently-used first and evicted from the tail.
+    """
+
+    def __init__(self, threshold: float = 0.95, capacity: int = 256):
+        """
+        Args:
+            threshold: Minimum cosine similarity for a cache hit
+            capacity: Maximum number of cached answers
+        """
+        self.threshold = threshold
+        self.capacity = capacity
+        self.entries: List[Tuple[np.ndarray, dict]] = []
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding: Sequence[float]) -> Optional[dict]:
+        """
+        Find the cached result for the most similar question
+        Args:
+            embedding: Embedding of the incoming question
+        Returns:
+            The cached result, or None if nothing is similar enough
+        """
+        if not self.entries:
+            return None
+
+        query = self._normalize(embedding)
+        cached = np.stack([vector for vector, _ in self.entries])
+        scores = cached @ query
+
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+
+        # Move the hit to the front so it is evicted last
+        entry = self.entries.pop(best)
+        self.entries.insert(0, entry)
+        return entry[1]
+
+    def insert(self, embedding: Sequence[float], result: dict):
+        """
+        Cache a result for a question
+        Args:
+            embedding: Embedding of the question
+            result: Result returned by the workflow
+        """
+        self.entries.insert(0, (self._normalize(embedding), result))
+        del self.entries[self.capacity:]